@@ -1,41 +1,201 @@
 from __future__ import annotations
 
 import argparse
+import bisect
+import functools
 import json
+import re
 import sqlite3
+import unicodedata
 from pathlib import Path
+from typing import Optional
+
+import zstandard
 
 DB_PATH = Path("data") / "agentvault.sqlite"
+SNIPPET_RADIUS = 80
 
+_RE_QUERY_TERM = re.compile(r"\w+\*?")
+# Column filters such as "title:" or "{title content}:" name columns, not terms.
+_RE_COLUMN_FILTER = re.compile(r"\{[^}]*\}\s*:|\w+\s*:")
+# The trailing ", N" of "NEAR(a b, N)" is a distance, not a term.
+_RE_NEAR_DISTANCE = re.compile(r"(\bNEAR\s*\([^)]*?),\s*\d+\s*\)")
+_FTS_OPERATORS = frozenset({"AND", "OR", "NOT", "NEAR"})
+_RE_NON_ASCII = re.compile(r"[^\x00-\x7f]+")
+
+# Fixed SQL text so sqlite3's statement cache hands back the prepared
+# statement; the winners' ids go in as one JSON array for the same reason.
+_RANK_SQL = "SELECT rowid FROM docs_fts WHERE docs_fts MATCH ? ORDER BY bm25(docs_fts) LIMIT ?"
+_FETCH_SQL = """
+SELECT id, source, path, title, content, content_zstd
+FROM docs WHERE id IN (SELECT value FROM json_each(?))
+"""
+
+
+@functools.lru_cache(maxsize=1)
+def _connect() -> sqlite3.Connection:
+    # Shared read-only connection; sqlite3 keeps its prepared statements.
+    return sqlite3.connect(
+        f"{DB_PATH.resolve().as_uri()}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=128,
+    )
+
+
+def _db_version() -> tuple[int, int]:
+    # In WAL mode writes land in the -wal file until a checkpoint, so both
+    # mtimes are needed to notice a re-index.
+    wal = DB_PATH.with_name(DB_PATH.name + "-wal")
+    return DB_PATH.stat().st_mtime_ns, wal.stat().st_mtime_ns if wal.exists() else 0
+
+
+@functools.lru_cache(maxsize=4096)
+def _fold_char(ch: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(c))
+
+
+def _fold(text: str) -> tuple[str, Optional[tuple[list[int], list[int]]]]:
+    """Strip diacritics like the index's remove_diacritics tokenizer option.
+
+    Returns the folded text and breakpoints mapping it back to ``text`` (see
+    _unfold), or None when offsets are unchanged. Breakpoints are only kept
+    where a character folds to other than one character, so the map stays
+    small however long the document is.
+    """
+    if text.isascii():
+        return text, None
+    runs = _RE_NON_ASCII.findall(text)
+    table = {}
+    for ch in set("".join(runs)):
+        if _fold_char(ch) != ch:
+            table[ord(ch)] = _fold_char(ch)
+    if not table:
+        return text, None
+    if len(runs) * 16 > len(text):
+        folded = text.translate(table)
+    else:
+        # Mostly ASCII: translate only the non-ASCII runs.
+        folded = _RE_NON_ASCII.sub(lambda m: m.group().translate(table), text)
+    resized = "".join(chr(c) for c, f in table.items() if len(f) != 1)
+    if not resized:
+        return folded, None
+    keys, vals = [0], [0]
+    shift = 0
+    for m in re.finditer("[" + re.escape(resized) + "]", text):
+        i, f = m.start(), table[ord(m.group())]
+        for k in range(1, len(f)):
+            keys.append(i + shift + k)
+            vals.append(i)
+        keys.append(i + shift + len(f))
+        vals.append(i + 1)
+        shift += len(f) - 1
+    return folded, (keys, vals)
+
+
+def _unfold(pos: int, breakpoints: tuple[list[int], list[int]]) -> int:
+    """Map an offset in folded text back to the original text."""
+    keys, vals = breakpoints
+    i = bisect.bisect_right(keys, pos) - 1
+    return vals[i] + pos - keys[i]
+
+
+@functools.lru_cache(maxsize=256)
+def _term_pattern(query: str) -> Optional[re.Pattern]:
+    """Regex matching the bare terms of an FTS5 MATCH expression."""
+    alts = []
+    query = _RE_NEAR_DISTANCE.sub(r"\1)", _RE_COLUMN_FILTER.sub(" ", query))
+    for term in _RE_QUERY_TERM.findall(query):
+        if term in _FTS_OPERATORS:
+            continue
+        term = _fold(term)[0]
+        if term.endswith("*"):
+            alts.append(re.escape(term[:-1]) + r"\w*")
+        else:
+            alts.append(re.escape(term))
+    if not alts:
+        return None
+    return re.compile(r"\b(?:" + "|".join(alts) + r")\b", re.IGNORECASE)
 
-def search(conn: sqlite3.Connection, query: str, limit: int = 8):
-    rows = conn.execute(
-        """
-        SELECT d.source, d.path, COALESCE(d.title,'') as title,
-               snippet(docs_fts, 1, '[', ']', '…', 12) as snip
-        FROM docs_fts
-        JOIN docs d ON d.id = docs_fts.rowid
-        WHERE docs_fts MATCH ?
-        ORDER BY bm25(docs_fts)
-        LIMIT ?
-        """,
-        (query, limit),
-    ).fetchall()
 
+def _snippet(content: str, pattern: Optional[re.Pattern]) -> str:
+    # Match on folded text so "cafe" finds "Café" just as MATCH did, then map
+    # hits back to offsets in the original content.
+    folded, breakpoints = _fold(content)
+
+    def span(m: re.Match) -> tuple[int, int]:
+        if breakpoints is None:
+            return m.span()
+        return _unfold(m.start(), breakpoints), _unfold(m.end() - 1, breakpoints) + 1
+
+    m = pattern.search(folded) if pattern else None
+    if m:
+        hit_start, hit_end = span(m)
+        start, end = max(0, hit_start - SNIPPET_RADIUS), hit_end + SNIPPET_RADIUS
+    else:
+        start, end = 0, 2 * SNIPPET_RADIUS
+
+    parts = []
+    pos = start
+    if m:
+        for hit in pattern.finditer(folded, m.start()):
+            hit_start, hit_end = span(hit)
+            if hit_start >= end:
+                break
+            hit_end = min(hit_end, end)
+            parts += [content[pos:hit_start], "[", content[hit_start:hit_end], "]"]
+            pos = hit_end
+    parts.append(content[pos:end])
+    text = "".join(parts)
+    return ("…" if start > 0 else "") + text + ("…" if end < len(content) else "")
+
+
+def _query(conn: sqlite3.Connection, query: str, limit: int) -> list[tuple]:
+    # Rank on the FTS index alone and build snippets here for the winners;
+    # snippet() would re-tokenize every matching document inside SQLite.
+    ids = [r[0] for r in conn.execute(_RANK_SQL, (query, limit))]
+    if not ids:
+        return []
+
+    docs = {r[0]: r[1:] for r in conn.execute(_FETCH_SQL, (json.dumps(ids),))}
+    pattern = _term_pattern(query)
+    dctx = zstandard.ZstdDecompressor()
+    results = []
+    for source, path, title, content, content_zstd in (docs[i] for i in ids if i in docs):
+        if content_zstd is not None:
+            content = dctx.decompress(content_zstd).decode("utf-8")
+        results.append((source, path, title, _snippet(content, pattern)))
+    return results
+
+
+@functools.lru_cache(maxsize=256)
+def _search_cached(query: str, limit: int, version: tuple[int, int]) -> tuple[tuple, ...]:
+    return tuple(_query(_connect(), query, limit))
+
+
+def _results(rows) -> list[dict]:
     return [
         {"source": r[0], "path": r[1], "title": r[2], "snippet": r[3]}
         for r in rows
     ]
 
 
+def search(conn: sqlite3.Connection, query: str, limit: int = 8):
+    return _results(_query(conn, query, limit))
+
+
+def cached_search(query: str, limit: int = 8):
+    """search() over the shared connection, memoized until the DB changes."""
+    return _results(_search_cached(query, limit, _db_version()))
+
+
 def main() -> None:
     ap = argparse.ArgumentParser()
     ap.add_argument("--query", required=True)
     ap.add_argument("--limit", type=int, default=8)
     args = ap.parse_args()
 
-    conn = sqlite3.connect(DB_PATH)
-    results = search(conn, args.query, args.limit)
+    results = cached_search(args.query, args.limit)
     print(json.dumps({"query": args.query, "results": results}, indent=2))
 
 
@@ -1,36 +1,122 @@
 from __future__ import annotations
 
 import argparse
+import codecs
 import datetime as dt
+import hashlib
+import io
 import json
 import os
 import re
 import sqlite3
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
 
-from bs4 import BeautifulSoup
+import ijson
+import zstandard
 from dateutil import parser as dtparser
+from lxml import etree
 
 
 VAULT_DIR = Path("vault")
 DATA_DIR = Path("data")
 DB_PATH = DATA_DIR / "agentvault.sqlite"
+BATCH_SIZE = 1000
+READ_CHUNK = 64 * 1024
+
+_ZSTD_LEVEL = 3
+# One context each, reused: the SQL functions below run once per row.
+_ZSTD_CCTX = zstandard.ZstdCompressor(level=_ZSTD_LEVEL)
+_ZSTD_DCTX = zstandard.ZstdDecompressor()
+
+_RE_BLANKS = re.compile(r"\n{3,}")
+_RE_MD_H1 = re.compile(r"^#\s+(.+)$", re.MULTILINE)
 
 
 def _ensure_dirs() -> None:
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def _compress(text: Optional[str]) -> Optional[bytes]:
+    if text is None:
+        return None
+    return _ZSTD_CCTX.compress(text.encode("utf-8"))
+
+
+def _decompress(blob: Optional[bytes]) -> Optional[str]:
+    if blob is None:
+        return None
+    return _ZSTD_DCTX.decompress(blob).decode("utf-8")
+
+
 def _db() -> sqlite3.Connection:
     _ensure_dirs()
-    conn = sqlite3.connect(DB_PATH)
+    # Implicit transactions open with BEGIN IMMEDIATE so an ingest pass takes
+    # the write lock once up front.
+    fresh = not DB_PATH.exists()
+    conn = sqlite3.connect(DB_PATH, isolation_level="IMMEDIATE")
+    if fresh:
+        # Only takes effect before the first table is written; larger pages
+        # keep FTS5 posting lists together.
+        conn.execute("PRAGMA page_size=8192;")
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=268435456;")  # 256 MiB
+    conn.execute("PRAGMA cache_size=-65536;")  # 64 MiB
+    conn.execute("PRAGMA wal_autocheckpoint=1000;")
+    conn.execute("PRAGMA foreign_keys=OFF;")
+    conn.execute("PRAGMA secure_delete=OFF;")
+    # docs_text and the FTS triggers call these, so every writer needs them.
+    conn.create_function("zstd_compress", 1, _compress, deterministic=True)
+    conn.create_function("zstd_decompress", 1, _decompress, deterministic=True)
     return conn
 
 
+# The triggers (and the docs_text view) call zstd_decompress(), which only
+# _db() registers: other clients such as the sqlite3 CLI fail with "no such
+# function" on any INSERT/UPDATE/DELETE of docs, or on reading docs_text or
+# docs_fts columns.
+_FTS_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+  INSERT INTO docs_fts(rowid, title, content, source, path)
+  VALUES (new.id, new.title, COALESCE(zstd_decompress(new.content_zstd), new.content),
+          new.source, new.path);
+END;
+
+CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+  INSERT INTO docs_fts(docs_fts, rowid, title, content, source, path)
+  VALUES('delete', old.id, old.title, COALESCE(zstd_decompress(old.content_zstd), old.content),
+         old.source, old.path);
+END;
+
+CREATE TRIGGER IF NOT EXISTS docs_au AFTER UPDATE ON docs BEGIN
+  INSERT INTO docs_fts(docs_fts, rowid, title, content, source, path)
+  VALUES('delete', old.id, old.title, COALESCE(zstd_decompress(old.content_zstd), old.content),
+         old.source, old.path);
+  INSERT INTO docs_fts(rowid, title, content, source, path)
+  VALUES (new.id, new.title, COALESCE(zstd_decompress(new.content_zstd), new.content),
+          new.source, new.path);
+END;
+"""
+
+
+def create_fts_triggers(conn: sqlite3.Connection) -> None:
+    conn.executescript(_FTS_TRIGGERS)
+
+
+def drop_fts_triggers(conn: sqlite3.Connection) -> None:
+    conn.executescript(
+        """
+        DROP TRIGGER IF EXISTS docs_ai;
+        DROP TRIGGER IF EXISTS docs_ad;
+        DROP TRIGGER IF EXISTS docs_au;
+        """
+    )
+
+
 def init_schema(conn: sqlite3.Connection) -> None:
     conn.executescript(
         """
@@ -38,98 +124,369 @@ def init_schema(conn: sqlite3.Connection) -> None:
           id INTEGER PRIMARY KEY,
           source TEXT NOT NULL,
           path TEXT NOT NULL,
-          title TEXT,
+          title TEXT NOT NULL DEFAULT '',
           created_at TEXT,
           content TEXT NOT NULL,
           sha256 TEXT,
-          ingested_at TEXT NOT NULL
+          ingested_at TEXT NOT NULL,
+          src_mtime REAL,
+          src_size INTEGER,
+          content_zstd BLOB
         );
+        """
+    )
+
+    # Upgrade DBs created before the source stat columns existed.
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(docs)")}
+    for name, decl in (("src_mtime", "REAL"), ("src_size", "INTEGER")):
+        if name not in cols:
+            conn.execute(f"ALTER TABLE docs ADD COLUMN {name} {decl}")
+
+    # Content used to be stored as plain text with docs_fts reading it from
+    # docs directly. Compress it in place and re-point the index at docs_text.
+    rebuild = "content_zstd" not in cols
+    if rebuild:
+        drop_fts_triggers(conn)
+        conn.execute("DROP TABLE IF EXISTS docs_fts")
+        conn.execute("ALTER TABLE docs ADD COLUMN content_zstd BLOB")
+        conn.execute("UPDATE docs SET content_zstd = zstd_compress(content), content = ''")
+
+    # Older DBs allowed NULL titles; readers no longer COALESCE them.
+    conn.execute("UPDATE docs SET title='' WHERE title IS NULL")
+
+    # Tokenizer and prefix indexes are fixed when docs_fts is created, so an
+    # index built without them is recreated and rebuilt.
+    fts = conn.execute("SELECT sql FROM sqlite_master WHERE name='docs_fts'").fetchone()
+    if fts and "prefix=" not in fts[0]:
+        conn.execute("DROP TABLE docs_fts")
+        rebuild = True
+
+    # main() drops the triggers for a bulk load and rebuilds afterwards. If a
+    # run died in between, docs holds rows docs_fts never saw; repair now.
+    triggers = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type='trigger'"
+        " AND name IN ('docs_ai', 'docs_ad', 'docs_au')"
+    ).fetchone()[0]
+    if triggers < 3:
+        rebuild = True
+
+    # docs.content stays '' for compressed rows; the view is what the
+    # external-content FTS table reads during 'rebuild'.
+    conn.executescript(
+        """
+        CREATE VIEW IF NOT EXISTS docs_text AS
+        SELECT id, title, COALESCE(zstd_decompress(content_zstd), content) AS content,
+               source, path
+        FROM docs;
 
         CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
           title,
           content,
           source UNINDEXED,
           path UNINDEXED,
-          content='docs',
-          content_rowid='id'
+          content='docs_text',
+          content_rowid='id',
+          tokenize='unicode61 remove_diacritics 2',
+          prefix='2 3 4'
         );
-
-        CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
-          INSERT INTO docs_fts(rowid, title, content, source, path)
-          VALUES (new.id, new.title, new.content, new.source, new.path);
-        END;
-
-        CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
-          INSERT INTO docs_fts(docs_fts, rowid, title, content, source, path)
-          VALUES('delete', old.id, old.title, old.content, old.source, old.path);
-        END;
-
-        CREATE TRIGGER IF NOT EXISTS docs_au AFTER UPDATE ON docs BEGIN
-          INSERT INTO docs_fts(docs_fts, rowid, title, content, source, path)
-          VALUES('delete', old.id, old.title, old.content, old.source, old.path);
-          INSERT INTO docs_fts(rowid, title, content, source, path)
-          VALUES (new.id, new.title, new.content, new.source, new.path);
-        END;
         """
     )
+    create_fts_triggers(conn)
+
+    # Target FTS5 leaf size just under one DB page so leaves don't spill into
+    # overflow pages. Only fresh DBs get 8 KiB pages; migrated ones keep
+    # whatever they were created with (and WAL mode can't VACUUM into a new
+    # page size), so size against the actual page.
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    conn.execute("INSERT INTO docs_fts(docs_fts, rank) VALUES('pgsz', ?)", (page_size - 192,))
+    if rebuild:
+        conn.execute("INSERT INTO docs_fts(docs_fts) VALUES('rebuild')")
+
+    # (source, path) is the upsert key. Older DBs never enforced it, so keep
+    # the newest row per path before adding the unique index.
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_docs_sp'"
+    ).fetchone():
+        conn.execute(
+            "DELETE FROM docs WHERE id NOT IN (SELECT MAX(id) FROM docs GROUP BY source, path)"
+        )
+        conn.execute("CREATE UNIQUE INDEX idx_docs_sp ON docs(source, path)")
     conn.commit()
 
 
-def _sha256(text: str) -> str:
-    import hashlib
+def compact_index(conn: sqlite3.Connection) -> None:
+    """Merge FTS5 segments, refresh planner stats, defragment and fold the WAL back in."""
+    with conn:
+        conn.execute("INSERT INTO docs_fts(docs_fts) VALUES('optimize')")
+    conn.execute("ANALYZE")
+    # In WAL mode VACUUM writes the rewritten database into the -wal file, so
+    # checkpoint after it, not before.
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+class _HashingReader:
+    """Binary reader that SHA-256s bytes as the parser pulls them."""
+
+    def __init__(self, f: BinaryIO) -> None:
+        self._f = f
+        self._h = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self._h.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        # Parsers may stop before EOF; hash whatever they left behind.
+        while self.read(READ_CHUNK):
+            pass
+        return self._h.hexdigest()
+
+
+class _PrefixedReader:
+    """Replays bytes already consumed while sniffing, then reads on from f."""
+
+    def __init__(self, head: bytes, f: BinaryIO) -> None:
+        self._head = head
+        self._f = f
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._head:
+            return self._f.read(size)
+        if size < 0:
+            data, self._head = self._head + self._f.read(), b""
+        else:
+            data, self._head = self._head[:size], self._head[size:]
+        return data
+
 
-    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+class _LenientUTF8Reader:
+    """Drops invalid UTF-8 bytes, as read_text(errors="ignore") did, for strict parsers."""
+
+    def __init__(self, f: BinaryIO) -> None:
+        self._f = f
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+
+    def read(self, size: int = -1) -> bytes:
+        # An empty result means EOF to the caller, so keep reading while a
+        # chunk decodes to nothing (all invalid, or a split multibyte char).
+        while True:
+            raw = self._f.read(size)
+            text = self._decoder.decode(raw, final=not raw)
+            if text or not raw:
+                return text.encode("utf-8")
+
+
+def _decode_text(data: bytes) -> str:
+    # newline=None gives the same universal-newline decoding as read_text().
+    return io.StringIO(data.decode("utf-8", errors="ignore"), newline=None).read()
+
+
+@dataclass
+class DocBatch:
+    """Pending writes for one source, flushed with executemany."""
+
+    conn: sqlite3.Connection
+    source: str
+    existing: dict[str, tuple] = field(default_factory=dict)
+    rows: dict[str, tuple] = field(default_factory=dict)
+    # One timestamp for the whole pass; rows don't need per-doc resolution.
+    ingested_at: str = field(
+        default_factory=lambda: dt.datetime.now(dt.timezone.utc).isoformat()
+    )
+
+    def __post_init__(self) -> None:
+        # One scan per source instead of a SELECT per file.
+        for path, mtime, size in self.conn.execute(
+            "SELECT path, src_mtime, src_size FROM docs WHERE source=?",
+            (self.source,),
+        ):
+            self.existing[path] = (mtime, size)
+
+    def unchanged(self, path: str, st: os.stat_result) -> bool:
+        return self.existing.get(path) == (st.st_mtime, st.st_size)
 
 
 def upsert_doc(
-    conn: sqlite3.Connection,
+    batch: DocBatch,
     *,
-    source: str,
     path: str,
     title: Optional[str],
     created_at: Optional[str],
-    content: str,
+    content_zstd: bytes,
+    sha: str,
+    st: os.stat_result,
 ) -> None:
-    sha = _sha256(content)
-    ingested_at = dt.datetime.now(dt.timezone.utc).isoformat()
+    batch.rows[path] = (
+        batch.source, path, title or "", created_at, content_zstd, sha, batch.ingested_at,
+        st.st_mtime, st.st_size,
+    )
+    if len(batch.rows) >= BATCH_SIZE:
+        flush_docs(batch)
 
-    row = conn.execute(
-        "SELECT id, sha256 FROM docs WHERE source=? AND path=?",
-        (source, path),
-    ).fetchone()
 
-    if row and row[1] == sha:
+def flush_docs(batch: DocBatch) -> None:
+    if not batch.rows:
         return
+    # Rows whose hash and stat are unchanged are left alone, so they don't
+    # fire the FTS update trigger.
+    batch.conn.executemany(
+        """
+        INSERT INTO docs(source, path, title, created_at, content, content_zstd, sha256,
+                         ingested_at, src_mtime, src_size)
+        VALUES(?,?,?,?,'',?,?,?,?,?)
+        ON CONFLICT(source, path) DO UPDATE SET
+          title=excluded.title,
+          created_at=excluded.created_at,
+          content=excluded.content,
+          content_zstd=excluded.content_zstd,
+          sha256=excluded.sha256,
+          ingested_at=excluded.ingested_at,
+          src_mtime=excluded.src_mtime,
+          src_size=excluded.src_size
+        WHERE docs.sha256 IS NOT excluded.sha256
+           OR docs.src_mtime IS NOT excluded.src_mtime
+           OR docs.src_size IS NOT excluded.src_size
+        """,
+        batch.rows.values(),
+    )
+    batch.rows.clear()
 
-    if row:
-        conn.execute(
-            """
-            UPDATE docs
-            SET title=?, created_at=?, content=?, sha256=?, ingested_at=?
-            WHERE id=?
-            """,
-            (title, created_at, content, sha, ingested_at, row[0]),
-        )
-    else:
-        conn.execute(
-            """
-            INSERT INTO docs(source, path, title, created_at, content, sha256, ingested_at)
-            VALUES(?,?,?,?,?,?,?)
-            """,
-            (source, path, title, created_at, content, sha, ingested_at),
-        )
+
+Parser = Callable[[Path, BinaryIO], Iterable[dict]]
+
+
+def _parse_file(p: Path, parse: Parser) -> tuple[Optional[dict], str, int]:
+    """Worker side: parse, hash and compress one file; returns (last doc, sha256, doc count)."""
+    # Every doc from one file shares its path, so only the last one is kept;
+    # hold it until the stream (and with it the file hash) is finished.
+    n = 0
+    last = None
+    with p.open("rb") as f:
+        reader = _HashingReader(f)
+        for doc in parse(p, reader):
+            last = doc
+            n += 1
+        sha = reader.hexdigest()
+    if last is not None:
+        # Compress here so the result crosses the process boundary small.
+        last["content_zstd"] = _compress(last.pop("content", None) or "")
+    return last, sha, n
+
+
+def _walk_files(base: Path) -> Iterator[os.DirEntry]:
+    """Recursive scandir walk; DirEntry caches the file type from readdir."""
+    stack = [str(base)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except PermissionError:
+            continue  # rglob() skipped unreadable directories too
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry
+
+
+def _ingest_files(batch: DocBatch, jobs: Iterable[tuple[str, Parser]]) -> int:
+    """Parse changed files in worker processes; all DB writes stay on this thread."""
+    n = 0
+    with ProcessPoolExecutor() as pool:
+        pending = {}
+        for path, parse in jobs:
+            st = os.stat(path)
+            if batch.unchanged(path, st):
+                continue
+            pending[pool.submit(_parse_file, Path(path), parse)] = (path, st)
+
+        for fut in as_completed(pending):
+            path, st = pending.pop(fut)
+            last, sha, count = fut.result()
+            n += count
+            if last is not None:
+                upsert_doc(
+                    batch,
+                    path=path,
+                    title=last.get("title"),
+                    created_at=last.get("created_at"),
+                    content_zstd=last["content_zstd"],
+                    sha=sha,
+                    st=st,
+                )
+    return n
 
 
 # ---------------------- ChatGPT ingest ----------------------
 
-def ingest_chatgpt_html(path: Path) -> Iterable[dict]:
-    html = path.read_text(encoding="utf-8", errors="ignore")
-    soup = BeautifulSoup(html, "lxml")
+_HTML_SKIP_TAGS = frozenset({"script", "style", "head", "meta", "link"})
+
+
+class _HTMLTextCollector:
+    """lxml parser target that keeps visible text, one part per text node."""
+
+    def __init__(self) -> None:
+        self.parts: list[str] = []
+        self._run: list[str] = []
+        self._skip = 0
+
+    def _flush(self) -> None:
+        if self._run:
+            self.parts.append("".join(self._run))
+            self._run.clear()
+
+    def start(self, tag: str, attrib: dict) -> None:
+        self._flush()
+        if tag in _HTML_SKIP_TAGS:
+            self._skip += 1
+
+    def end(self, tag: str) -> None:
+        self._flush()
+        if tag in _HTML_SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def data(self, data: str) -> None:
+        if not self._skip:
+            self._run.append(data)
+
+    def close(self) -> str:
+        self._flush()
+        return "\n".join(self.parts)
 
+
+def ingest_chatgpt_html(path: Path, f: BinaryIO) -> Iterable[dict]:
     # Best-effort parsing: ChatGPT exports can change structure.
     # We aim to extract readable text with a title derived from the file path.
-    text = soup.get_text("\n")
-    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    # The document is streamed through a parser target, so no tree is built.
+    collector = _HTMLTextCollector()
+    parser = etree.HTMLParser(target=collector, huge_tree=True)
+    # Decode here, dropping invalid bytes as read_text(errors="ignore") did,
+    # so libxml2 only ever sees text; the hash still covers the raw bytes.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    carry = ""
+    try:
+        while raw := f.read(READ_CHUNK):
+            chunk = carry + decoder.decode(raw)
+            # libxml2's push parser mis-handles a tag split across two feeds
+            # (e.g. "</scr" + "ipt>"), so hold back an unterminated tag.
+            cut = chunk.rfind("<")
+            if cut != -1 and chunk.find(">", cut) == -1:
+                chunk, carry = chunk[:cut], chunk[cut:]
+            else:
+                carry = ""
+            if chunk:
+                parser.feed(chunk)
+        carry += decoder.decode(b"", final=True)
+        if carry:
+            parser.feed(carry)
+        parser.close()
+    except (etree.XMLSyntaxError, UnicodeDecodeError):
+        pass  # empty or unparseable; keep whatever text was collected
+
+    text = collector.close()
+    text = _RE_BLANKS.sub("\n\n", text).strip()
 
     yield {
         "title": f"ChatGPT export: {path.name}",
@@ -138,16 +495,20 @@ def ingest_chatgpt_html(path: Path) -> Iterable[dict]:
     }
 
 
-def ingest_chatgpt_conversations_json(path: Path) -> Iterable[dict]:
-    data = json.loads(path.read_text(encoding="utf-8", errors="ignore"))
+def ingest_chatgpt_conversations_json(path: Path, f: BinaryIO) -> Iterable[dict]:
+    # Supports both list and dict-ish exports; sniff which one from the first
+    # significant byte, then stream one conversation at a time.
+    head = f.read(READ_CHUNK)
+    while head and not head.strip():
+        head = f.read(READ_CHUNK)
+    prefix = {b"{": "conversations.item", b"[": "item"}.get(head.lstrip()[:1])
+    if prefix is None:
+        return
 
-    # Supports both list and dict-ish exports.
-    if isinstance(data, dict) and "conversations" in data:
-        convs = data["conversations"]
-    else:
-        convs = data
+    join_lines = "\n".join
 
-    for c in convs if isinstance(convs, list) else []:
+    stream = _LenientUTF8Reader(_PrefixedReader(head, f))
+    for c in ijson.items(stream, prefix, use_float=True):
         title = c.get("title") or "ChatGPT conversation"
         created = c.get("create_time") or c.get("created_at")
         created_at = None
@@ -160,17 +521,26 @@ def ingest_chatgpt_conversations_json(path: Path) -> Iterable[dict]:
                 except Exception:
                     created_at = None
 
-        # Pull messages in a readable linear form.
+        # Pull messages in a readable linear form. Exports can hold millions
+        # of mapping nodes, so index directly and let the rare malformed node
+        # take the exception path.
         parts = []
         mapping = c.get("mapping") or {}
-        for _, node in mapping.items():
-            msg = (node or {}).get("message") or {}
-            if not msg:
+        for node in mapping.values():
+            try:
+                msg = node["message"]
+                content = msg["content"]["parts"]
+            except (KeyError, TypeError):
                 continue
-            role = ((msg.get("author") or {}).get("role") or "").strip() or "unknown"
-            content = (msg.get("content") or {}).get("parts")
+            try:
+                role = msg["author"]["role"].strip() or "unknown"
+            except (KeyError, TypeError, AttributeError):
+                role = "unknown"
             if isinstance(content, list):
-                body = "\n".join(str(p) for p in content)
+                try:
+                    body = join_lines(content)
+                except TypeError:  # non-text parts, e.g. image pointers
+                    body = join_lines(map(str, content))
             else:
                 body = str(content) if content is not None else ""
             body = body.strip()
@@ -184,85 +554,78 @@ def ingest_chatgpt_conversations_json(path: Path) -> Iterable[dict]:
         }
 
 
+_CHATGPT_PARSERS: dict[str, Parser] = {
+    ".html": ingest_chatgpt_html,
+    ".json": ingest_chatgpt_conversations_json,
+}
+
+
 def ingest_chatgpt(conn: sqlite3.Connection) -> int:
     base = VAULT_DIR / "chatgpt"
     if not base.exists():
         return 0
 
-    n = 0
-    for p in base.rglob("*"):
-        if not p.is_file():
+    jobs = []
+    for entry in _walk_files(base):
+        name_l = entry.name.lower()
+        parse = _CHATGPT_PARSERS.get(os.path.splitext(name_l)[1])
+        if parse is ingest_chatgpt_conversations_json and "conversation" not in name_l:
             continue
+        if parse:
+            jobs.append((entry.path, parse))
 
-        if p.name.lower().endswith(".html"):
-            for doc in ingest_chatgpt_html(p):
-                upsert_doc(
-                    conn,
-                    source="chatgpt",
-                    path=str(p),
-                    title=doc.get("title"),
-                    created_at=doc.get("created_at"),
-                    content=doc.get("content") or "",
-                )
-                n += 1
-
-        if p.name.lower().endswith(".json") and "conversation" in p.name.lower():
-            for doc in ingest_chatgpt_conversations_json(p):
-                upsert_doc(
-                    conn,
-                    source="chatgpt",
-                    path=str(p),
-                    title=doc.get("title"),
-                    created_at=doc.get("created_at"),
-                    content=doc.get("content") or "",
-                )
-                n += 1
-
-    conn.commit()
+    with conn:
+        batch = DocBatch(conn, "chatgpt")
+        n = _ingest_files(batch, jobs)
+        flush_docs(batch)
     return n
 
 
 # ---------------------- Perplexity ingest ----------------------
 
-def ingest_perplexity_markdown(path: Path) -> dict:
-    text = path.read_text(encoding="utf-8", errors="ignore")
+def ingest_perplexity_markdown(path: Path, f: BinaryIO) -> Iterable[dict]:
+    data = f.read()
+    text = _decode_text(data)
     title = None
 
-    # First heading as title if present.
-    m = re.search(r"^#\s+(.+)$", text, flags=re.MULTILINE)
-    if m:
-        title = m.group(1).strip()
+    # First heading as title if present. Exports almost always open with it,
+    # so check the first line directly before scanning the whole file.
+    if data.startswith(b"# "):
+        eol = data.find(b"\n")
+        title = data[2 : eol if eol != -1 else len(data)].decode("utf-8", errors="ignore").strip()
+    if not title:
+        m = _RE_MD_H1.search(text)
+        if m:
+            title = m.group(1).strip()
 
-    return {
+    yield {
         "title": title or f"Perplexity export: {path.name}",
         "created_at": None,
         "content": text.strip(),
     }
 
 
+_PERPLEXITY_PARSERS: dict[str, Parser] = {
+    ".md": ingest_perplexity_markdown,
+    ".txt": ingest_perplexity_markdown,
+}
+
+
 def ingest_perplexity(conn: sqlite3.Connection) -> int:
     base = VAULT_DIR / "perplexity"
     if not base.exists():
         return 0
 
-    n = 0
-    for p in base.rglob("*"):
-        if not p.is_file():
-            continue
-
-        if p.suffix.lower() in {".md", ".txt"}:
-            doc = ingest_perplexity_markdown(p)
-            upsert_doc(
-                conn,
-                source="perplexity",
-                path=str(p),
-                title=doc.get("title"),
-                created_at=doc.get("created_at"),
-                content=doc.get("content") or "",
-            )
-            n += 1
+    jobs = []
+    for entry in _walk_files(base):
+        parse = _PERPLEXITY_PARSERS.get(os.path.splitext(entry.name)[1].lower())
+        if parse:
+            jobs.append((entry.path, parse))
 
-    conn.commit()
+    with conn:
+        batch = DocBatch(conn, "perplexity")
+        n = _ingest_files(batch, jobs)
+        flush_docs(batch)
     return n
 
 
@@ -276,8 +639,21 @@ def main() -> None:
     if args.init_only:
         return
 
-    n1 = ingest_chatgpt(conn)
-    n2 = ingest_perplexity(conn)
+    # Bulk load: keep the FTS triggers out of the write path and rebuild the
+    # index once at the end instead of per row.
+    drop_fts_triggers(conn)
+    n1 = n2 = 0
+    try:
+        n1 = ingest_chatgpt(conn)
+        n2 = ingest_perplexity(conn)
+    finally:
+        with conn:
+            if n1 or n2:
+                conn.execute("INSERT INTO docs_fts(docs_fts) VALUES('rebuild')")
+        create_fts_triggers(conn)
+
+    if n1 or n2:
+        compact_index(conn)
     print(json.dumps({"db": str(DB_PATH), "ingested": {"chatgpt": n1, "perplexity": n2}}, indent=2))
 
 